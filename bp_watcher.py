@@ -39,6 +39,10 @@ def main():
         print("Error: 'bp_executable_path', 'credentials', 'login_screen_regions', or 'server_endpoint' not fully found in configuration.")
         return
 
+    # Per-stage time budgets for the watchdog; any stage missing from config keeps its default
+    gui_utils.configure_stage_timeouts(config.get("stage_timeouts"))
+    gui_utils.stage_overruns.clear()
+
     # Determine process name from executable path (e.g., "notepad.exe" -> "notepad.exe")
     # If path has arguments (e.g., "xterm -T title"), take the first part.
     base_executable = bp_executable_path.split(' ')[0]
@@ -58,8 +62,11 @@ def main():
         # --- BEGIN wmctrl DEBUG ---
         print("DEBUG: Listing windows with wmctrl BEFORE find_window...")
         try:
-            wmctrl_output = subprocess.run(['wmctrl', '-lG'], capture_output=True, text=True, check=True) # -G for geometry
+            wmctrl_output = subprocess.run(['wmctrl', '-lG'], capture_output=True, text=True, check=True,
+                                           timeout=gui_utils.stage_timeouts["wmctrl"]) # -G for geometry
             print("DEBUG: wmctrl -lG output:\n" + wmctrl_output.stdout)
+        except subprocess.TimeoutExpired:
+            gui_utils.record_stage_overrun("wmctrl", "wmctrl -lG killed")
         except subprocess.CalledProcessError as e:
             print(f"DEBUG: wmctrl -lG failed with error: {e}")
             if e.stderr:
@@ -69,12 +76,15 @@ def main():
 
         print(f"DEBUG: Checking process status for {process_name}...")
         try:
-            ps_output = subprocess.run(['ps', 'aux'], capture_output=True, text=True, check=True)
+            ps_output = subprocess.run(['ps', 'aux'], capture_output=True, text=True, check=True,
+                                       timeout=gui_utils.stage_timeouts["ps"])
             gedit_processes = [line for line in ps_output.stdout.split('\n') if process_name in line]
             if gedit_processes:
                 print(f"DEBUG: Found gedit process(es):\n" + "\n".join(gedit_processes))
             else:
                 print(f"DEBUG: No gedit process found with 'ps aux'.")
+        except subprocess.TimeoutExpired:
+            gui_utils.record_stage_overrun("ps", "ps aux killed")
         except Exception as e_ps:
             print(f"DEBUG: ps aux command failed: {e_ps}")
         # --- END wmctrl DEBUG ---
@@ -164,6 +174,7 @@ def main():
                         time.sleep(1) # Allow text to render
 
                         print("Attempting to extract and parse patient data...")
+                        parsed_patient_data = [] # Stays empty if capture/OCR fails or overruns
                         raw_extracted_text = gui_utils.extract_text_from_region(patient_list_coords)
                         if raw_extracted_text:
                             parsed_patient_data = gui_utils.parse_patient_data_simple(raw_extracted_text)
@@ -205,6 +216,8 @@ def main():
         #    print(f"Could not get all window titles using wmctrl: {e}")
 
 
+    if gui_utils.stage_overruns:
+        print(f"Watchdog: stage overruns this cycle: {gui_utils.stage_overruns}")
     print("BP Watcher finished.")
         # Ensure gedit is closed if it was launched by the script.
         # This is tricky because is_process_running checks by name, and we might close a user's gedit.
@@ -10,6 +10,74 @@ import datetime  # For timestamp in parse_patient_data_simple
 import requests  # For send_data_to_server
 import json      # For send_data_to_server (json.dumps)
 import time      # For retry_delay in send_data_to_server
+import threading # For the stage watchdog in run_with_watchdog
+
+# Default time budget (in seconds) for each stage of a sync cycle.
+# Can be overridden per stage via "stage_timeouts" in config.json (see configure_stage_timeouts).
+DEFAULT_STAGE_TIMEOUTS = {
+    "wmctrl": 5,      # wmctrl -l / -a calls
+    "ps": 5,          # ps aux debug listing
+    "screenshot": 10, # pyautogui screenshot capture
+    "ocr": 30,        # tesseract OCR on a captured region
+}
+stage_timeouts = dict(DEFAULT_STAGE_TIMEOUTS)
+stage_overruns = {} # stage name -> number of times it overran its budget
+
+def configure_stage_timeouts(overrides):
+    """
+    Applies per-stage timeout overrides (e.g. from config.json) on top of the defaults.
+    Unknown stage names and non-positive values are ignored with a warning.
+    """
+    stage_timeouts.clear()
+    stage_timeouts.update(DEFAULT_STAGE_TIMEOUTS)
+    if not overrides:
+        return stage_timeouts
+    for stage, seconds in overrides.items():
+        if stage not in DEFAULT_STAGE_TIMEOUTS:
+            print(f"Warning: Unknown stage '{stage}' in stage_timeouts, ignoring.")
+            continue
+        if not isinstance(seconds, (int, float)) or seconds <= 0:
+            print(f"Warning: Invalid timeout {seconds!r} for stage '{stage}', using default {DEFAULT_STAGE_TIMEOUTS[stage]}s.")
+            continue
+        stage_timeouts[stage] = seconds
+    print(f"Stage timeouts: {stage_timeouts}")
+    return stage_timeouts
+
+def record_stage_overrun(stage, detail=""):
+    """
+    Records that a stage exceeded its time budget so it can be reported at the end of the cycle.
+    """
+    stage_overruns[stage] = stage_overruns.get(stage, 0) + 1
+    message = f"Watchdog: stage '{stage}' exceeded its {stage_timeouts.get(stage)}s budget"
+    if detail:
+        message += f" ({detail})"
+    print(message + ". Skipping it for this cycle.")
+
+def run_with_watchdog(stage, func, *args, **kwargs):
+    """
+    Runs func(*args, **kwargs) in a daemon thread and waits at most the stage's time budget.
+    Returns (True, result) if it finished in time, or (False, None) if it overran.
+    A call that overruns cannot be killed from Python, so it is abandoned and its result discarded;
+    stages backed by a subprocess should use the subprocess/tesseract timeout instead so the child is killed.
+    Exceptions raised by func are re-raised in the caller.
+    """
+    outcome = {}
+
+    def target():
+        try:
+            outcome['result'] = func(*args, **kwargs)
+        except BaseException as e:
+            outcome['error'] = e
+
+    worker = threading.Thread(target=target, name=f"bpwatcher-{stage}", daemon=True)
+    worker.start()
+    worker.join(stage_timeouts[stage])
+    if worker.is_alive():
+        record_stage_overrun(stage, "abandoned worker thread")
+        return False, None
+    if 'error' in outcome:
+        raise outcome['error']
+    return True, outcome.get('result')
 
 def find_window(title_regex):
     """
@@ -17,7 +85,7 @@ def find_window(title_regex):
     Returns a dictionary {'id': window_id, 'title': window_title} or None.
     """
     try:
-        result = subprocess.check_output(['wmctrl', '-l'], text=True)
+        result = subprocess.check_output(['wmctrl', '-l'], text=True, timeout=stage_timeouts["wmctrl"])
         windows = result.strip().split('\n')
         # Example wmctrl -l line:
         # 0x04600003  0 gedit          swebot-jules Untitled Document 1
@@ -32,6 +100,9 @@ def find_window(title_regex):
                 print(f"wmctrl found window: ID={window_id}, Title='{window_title}'")
                 return {'id': window_id, 'title': window_title}
         return None
+    except subprocess.TimeoutExpired:
+        record_stage_overrun("wmctrl", "wmctrl -l killed")
+        return None
     except FileNotFoundError:
         print("Error: wmctrl command not found. Please ensure it is installed.")
         return None
@@ -46,7 +117,7 @@ def focus_window(window_dict):
     if window_dict and 'id' in window_dict:
         window_id = window_dict['id']
         try:
-            subprocess.check_call(['wmctrl', '-i', '-a', window_id])
+            subprocess.check_call(['wmctrl', '-i', '-a', window_id], timeout=stage_timeouts["wmctrl"])
             # Additional command to ensure it's unminimized and raised, -R can be aggressive
             # subprocess.check_call(['wmctrl', '-i', '-R', window_id])
             print(f"Attempted to focus window ID '{window_id}' using wmctrl -i -a.")
@@ -59,6 +130,9 @@ def focus_window(window_dict):
             # else:
             #    print(f"Window {window_id} may not be active. Current active: {active_id}")
             return True
+        except subprocess.TimeoutExpired:
+            record_stage_overrun("wmctrl", f"wmctrl -i -a {window_id} killed")
+            return False
         except subprocess.CalledProcessError as e:
             print(f"Error focusing window ID '{window_id}' with wmctrl: {e}")
             return False
@@ -123,7 +197,10 @@ def take_screenshot_region(x, y, width, height, filepath):
             os.makedirs(screenshot_dir)
             print(f"Created directory: {screenshot_dir}")
 
-        screenshot = pyautogui.screenshot(region=(x, y, width, height))
+        # Capture under the watchdog; saving happens here so an abandoned capture never writes the file
+        finished, screenshot = run_with_watchdog("screenshot", pyautogui.screenshot, region=(x, y, width, height))
+        if not finished:
+            return False
         screenshot.save(filepath)
         print(f"Screenshot saved to {filepath}")
         return True
@@ -175,7 +252,7 @@ def check_login_success(success_region_coords, expected_text):
     try:
         print(f"Performing OCR on {screenshot_path} to find text: '{expected_text}'")
         img = Image.open(screenshot_path)
-        ocr_text = pytesseract.image_to_string(img)
+        ocr_text = pytesseract.image_to_string(img, timeout=stage_timeouts["ocr"])
         print(f"OCR Result: '{ocr_text.strip()}'")
         if expected_text in ocr_text:
             print(f"Login success: Found '{expected_text}' in OCR text.")
@@ -183,6 +260,13 @@ def check_login_success(success_region_coords, expected_text):
         else:
             print(f"Login failed: Did not find '{expected_text}' in OCR text.")
             return False
+    except RuntimeError as e:
+        # pytesseract kills tesseract and raises RuntimeError when the timeout is hit
+        if "timeout" in str(e).lower():
+            record_stage_overrun("ocr", "tesseract killed")
+        else:
+            print(f"Error during OCR processing: {e}")
+        return False
     except Exception as e:
         print(f"Error during OCR processing: {e}")
         return False
@@ -202,9 +286,15 @@ def extract_text_from_region(region_coords):
     try:
         print(f"Performing OCR on {screenshot_path} for data extraction...")
         img = Image.open(screenshot_path)
-        ocr_text = pytesseract.image_to_string(img)
+        ocr_text = pytesseract.image_to_string(img, timeout=stage_timeouts["ocr"])
         print(f"Raw OCR Extracted Text:\n---\n{ocr_text.strip()}\n---")
         return ocr_text
+    except RuntimeError as e:
+        if "timeout" in str(e).lower():
+            record_stage_overrun("ocr", "tesseract killed")
+        else:
+            print(f"Error during OCR for data extraction: {e}")
+        return None
     except Exception as e:
         print(f"Error during OCR for data extraction: {e}")
         return None